@@ -1,9 +1,28 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from app.routes.IpLocationRouter import router as location_router
 from app.routes.PointBuilderRouter import router as point_builder_router
-from app.routes.ReputationManagerRouter import app as reputation_manager_router
+from app.routes.ReputationManagerRouter import app as reputation_manager_router, create_manager
+from app.services.IpGeoLocationTracker import close_client
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Reads the rules and blacklist files, so build it off the event loop
+    manager = await asyncio.to_thread(create_manager)
+    app.state.reputation_manager = manager
+    yield
+    # Write changes still waiting out the debounce before the loop exits
+    await manager.flush()
+    await manager.blacklist_service.flush()
+    manager.close()
+    await close_client()
+
 
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
 
 # Location based ids
 app.include_router(location_router, prefix="/location_tracker", tags=["Location Tracker"]) 
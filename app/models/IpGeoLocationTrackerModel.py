@@ -2,7 +2,7 @@ from dataclasses import dataclass
 from typing import List
 from datetime import datetime
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class TimezoneInfo:
     id: str
     abbr: str
@@ -11,14 +11,14 @@ class TimezoneInfo:
     utc: str
     current_time: datetime
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class ConnectionInfo:
     asn: int
     org: str
     isp: str
     domain: str
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class LocationInfo:
     type: str
     continent: str
@@ -1,5 +1,6 @@
 from fastapi import APIRouter, HTTPException
-from app.services.IpGeoLocationTracker import IpGeoLocationTracker
+from fastapi.responses import ORJSONResponse
+from app.services.IpGeoLocationTracker import IpGeoLocationTracker, cache_stats
 
 router = APIRouter()
 
@@ -7,11 +8,15 @@ router = APIRouter()
 async def ip_location(ip_address: str):
     try:
         tracker = IpGeoLocationTracker(ip_address)
-        tracker.track_ip()
+        await tracker.track_ip()
         
-        # Return the tracker as a dictionary (assuming it has a to_dict method)
-        return tracker.to_dict()
+        # orjson encodes the datetime fields natively, so skip jsonable_encoder
+        return ORJSONResponse(tracker.to_dict())
     
     except Exception as e:
         # Catch any exceptions and return a 500 Internal Server Error
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+
+@router.get("/stats")
+async def location_cache_stats():
+    return cache_stats()
@@ -1,4 +1,7 @@
+import asyncio
+
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import ORJSONResponse
 from typing import Dict, Optional, Union
 from app.services.PointRuleBuilder import PointRule, PointRuleSystem
 
@@ -12,7 +15,9 @@ system = PointRuleSystem()
 async def add_rule(rule: PointRule):
     try:
         system.add_rule(rule)
-        return {"message": "Rule added successfully", "rule": rule.dict()}
+        # rule.dict() is a plain field copy; returning the response directly
+        # skips jsonable_encoder walking it again
+        return ORJSONResponse({"message": "Rule added successfully", "rule": rule.dict()}, status_code=201)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error adding rule: {str(e)}")
 
@@ -21,7 +26,7 @@ async def add_rule(rule: PointRule):
 async def create_group(name: str, description: Optional[str] = None):
     try:
         group = system.create_group(name=name, description=description)
-        return {"message": "Group created successfully", "group": group.dict()}
+        return ORJSONResponse({"message": "Group created successfully", "group": group.dict()}, status_code=201)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error creating group: {str(e)}")
 
@@ -30,12 +35,12 @@ async def create_group(name: str, description: Optional[str] = None):
 async def add_rule_to_group(group_name: str, rule: PointRule):
     try:
         system.add_to_group(group_name, rule)
-        return {"message": "Rule added to group successfully", "rule": rule.dict()}
+        return ORJSONResponse({"message": "Rule added to group successfully", "rule": rule.dict()}, status_code=201)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error adding rule to group: {str(e)}")
 
 # Route to evaluate rules based on input data
-@router.post("/evaluate", response_model=dict)
+@router.post("/evaluate")
 async def evaluate_rules(data: Dict[str, Optional[Union[str, int, float]]]):
     try:
         total_points = system.evaluate_rules(data)
@@ -47,7 +52,7 @@ async def evaluate_rules(data: Dict[str, Optional[Union[str, int, float]]]):
 @router.post("/save_rules")
 async def save_rules(filepath: str):
     try:
-        system.save_rules(filepath)
+        await asyncio.to_thread(system.save_rules, filepath)
         return {"message": "Rules saved successfully", "filepath": filepath}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error saving rules: {str(e)}")
@@ -57,7 +62,8 @@ async def save_rules(filepath: str):
 async def load_rules(filepath: str):
     try:
         global system
-        system = PointRuleSystem.load_rules(filepath)
+        # The path comes from the client, so the file is not trusted
+        system = await asyncio.to_thread(PointRuleSystem.load_rules, filepath, validate=True)
         return {"message": "Rules loaded successfully", "system": system.dict()}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error loading rules: {str(e)}")
@@ -1,19 +1,37 @@
-from fastapi import APIRouter, FastAPI, HTTPException
+import asyncio
+
+from fastapi import APIRouter, Depends, FastAPI, HTTPException, Request
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
 from typing import Optional
 from datetime import datetime
 from pathlib import Path
 
 from app.models.ReputationManagerModel import BlacklistReason
+from app.services.BlackListTracker import BlacklistService
+from app.services.PointRuleBuilder import PointRuleSystem
 from app.services.ReputationManager import ReputationManager 
+from app.util.MsgPackResponse import MsgPackResponse, wants_msgpack
 
 app = APIRouter()
 
-# Initialize the ReputationManager
+# Files backing the ReputationManager, which is built during app startup
 current_dir = Path(__file__).parent
 rules_file = current_dir / "point_rules.json"
 blacklist_file = current_dir / "blacklist.json"
-manager = ReputationManager(rules_file=rules_file, blacklist_file=blacklist_file)
+
+
+def create_manager() -> ReputationManager:
+    """Build the ReputationManager. Reads the rules and blacklist files."""
+    # The rules file is written by this server, so it loads without revalidation
+    point_system = PointRuleSystem.load_rules(rules_file) if rules_file.exists() else PointRuleSystem()
+    blacklist_service = BlacklistService(storage_path=str(blacklist_file))
+    return ReputationManager(blacklist_service=blacklist_service, point_system=point_system)
+
+
+def get_manager(request: Request) -> ReputationManager:
+    """Dependency returning the ReputationManager created in the app lifespan."""
+    return request.app.state.reputation_manager
 
 
 
@@ -33,93 +51,116 @@ class AnalyzeIpResponse(BaseModel):
     blacklist_entry: Optional[dict] = None
     error: Optional[str] = None
 
+# Handlers are async and call the manager on the event loop, which owns its
+# state, debounced writers and the shared geolocation client; only file
+# reads and writes are pushed to a worker thread.
 @app.get("/")
-def read_root():
+async def read_root():
     return {"message": "IP Reputation Manager API is running"}
 
-@app.post("/analyze/{ip_address}", response_model=AnalyzeIpResponse)
-def analyze_ip(ip_address: str):
+# AnalyzeIpResponse only documents the schema; the result is encoded by orjson
+# directly instead of being rebuilt and revalidated as a model per request
+@app.post("/analyze/{ip_address}", responses={200: {"model": AnalyzeIpResponse}})
+async def analyze_ip(ip_address: str, manager: ReputationManager = Depends(get_manager)):
     """Analyze the given IP address."""
     try:
-        result = manager.analyze_ip(ip_address)
-        return result
+        result = await manager.analyze_ip(ip_address)
+        return ORJSONResponse(result)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/blacklist/add")
-def add_to_blacklist(request: AddBlacklistEntryRequest):
+async def add_to_blacklist(request: AddBlacklistEntryRequest, manager: ReputationManager = Depends(get_manager)):
     """Add an IP address to the blacklist."""
     try:
         manager.add_to_blacklist(
             ip_address=request.ip_address,
-            reason=BlacklistReason(reason=request.reason),
+            reason=BlacklistReason(request.reason),
             expires_at=request.expires_at,
             notes=request.notes
         )
         return {"message": f"IP {request.ip_address} added to the blacklist"}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.delete("/blacklist/remove/{ip_address}")
-def remove_from_blacklist(ip_address: str):
+async def remove_from_blacklist(ip_address: str, manager: ReputationManager = Depends(get_manager)):
     """Remove an IP address from the blacklist."""
     try:
-        manager.remove_from_blacklist(ip_address)
+        if not manager.remove_from_blacklist(ip_address):
+            raise HTTPException(status_code=404, detail=f"IP {ip_address} is not in the blacklist")
         return {"message": f"IP {ip_address} removed from the blacklist"}
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/blacklist/check/{ip_address}")
-def check_blacklist(ip_address: str):
+async def check_blacklist(ip_address: str, http_request: Request, manager: ReputationManager = Depends(get_manager)):
     """Check if an IP is blacklisted."""
     try:
-        entry = manager.is_blacklisted(ip_address)
-        if entry:
-            return entry.model_dump()
-        return {"message": f"IP {ip_address} is not blacklisted"}
+        if manager.is_blacklisted(ip_address):
+            content = {
+                "ip_address": ip_address,
+                "blacklisted": True,
+                "entry": manager.get_blacklist_entry(ip_address)
+            }
+        else:
+            content = {"message": f"IP {ip_address} is not blacklisted"}
+
+        # Service-to-service callers can ask for MessagePack via the Accept header
+        if wants_msgpack(http_request):
+            return MsgPackResponse(content)
+        return ORJSONResponse(content)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/rules")
-def get_rules():
+async def get_rules(manager: ReputationManager = Depends(get_manager)):
     """Get all reputation rules."""
     try:
-        return {"rules": [rule.model_dump() for rule in manager.rules]}
+        return ORJSONResponse({"rules": [rule.model_dump(mode="json") for rule in manager.rules]})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/rules/save")
-def save_rules():
+async def save_rules(manager: ReputationManager = Depends(get_manager)):
     """Save current rules to the rules file."""
     try:
-        manager.save_rules(rules_file)
+        await asyncio.to_thread(manager.save_rules, rules_file)
         return {"message": "Rules saved successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/rules/load")
-def load_rules():
+async def load_rules(manager: ReputationManager = Depends(get_manager)):
     """Load rules from the rules file."""
     try:
-        manager.load_rules(rules_file)
+        await asyncio.to_thread(manager.load_rules, rules_file)
         return {"message": "Rules loaded successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/blacklist/save")
-def save_blacklist():
+async def save_blacklist(manager: ReputationManager = Depends(get_manager)):
     """Save the current blacklist to the blacklist file."""
     try:
-        manager.save_blacklist(blacklist_file)
+        await manager.save_blacklist()
         return {"message": "Blacklist saved successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/blacklist/load")
-def load_blacklist():
+async def load_blacklist(manager: ReputationManager = Depends(get_manager)):
     """Load blacklist from the blacklist file."""
     try:
-        manager.load_blacklist(blacklist_file)
+        await asyncio.to_thread(manager.load_blacklist)
         return {"message": "Blacklist loaded successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
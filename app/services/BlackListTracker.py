@@ -1,10 +1,32 @@
-from typing import List, Optional, Set
+from typing import Dict, List, Optional, Set, Tuple, Union
 import ipaddress
 from dataclasses import dataclass
 from datetime import datetime
-import json
+from functools import lru_cache
 import os
 
+import pytricia
+
+from app.util.DebouncedWriter import DebouncedWriter
+from app.util.SerializedFile import atomic_write_bytes, encode_for_path, load_path
+
+
+@lru_cache(maxsize=65536)
+def _parse_network(entry: str) -> Optional[Union[ipaddress.IPv4Network, ipaddress.IPv6Network]]:
+    """Parse an IP address or CIDR range, returning None if it is invalid."""
+    try:
+        return ipaddress.ip_network(entry, strict=False)
+    except ValueError:
+        return None
+
+
+@lru_cache(maxsize=65536)
+def _parse_address(ip: str) -> Tuple[int, int, str]:
+    """Return the IP version, packed integer and normalized string; raises ValueError if invalid."""
+    ip_addr = ipaddress.ip_address(ip)
+    return ip_addr.version, int(ip_addr), str(ip_addr)
+
+
 @dataclass
 class UploadResult:
     success: bool
@@ -16,68 +38,162 @@ class UploadResult:
 class BlacklistService:
     def __init__(self, storage_path: str = "blacklist_data.json"):
         self.storage_path = storage_path
-        self.ip_networks = set()  # Store IP networks (for CIDR)
-        self.single_ips = set()   # Store individual IPs
+        # Exact IPs (the bulk of most blacklists) go in per-family sets of packed
+        # integers, far smaller than strings; only real CIDR ranges need a
+        # longest-prefix match in the per-family tries
+        self._single_v4: Set[int] = set()
+        self._single_v6: Set[int] = set()
+        self._trie_v4 = pytricia.PyTricia(32)
+        self._trie_v6 = pytricia.PyTricia(128)
         self.last_upload_time = None
+        # Details (reason, notes, ...) of entries added one at a time, keyed by entry
+        self._details: Dict[str, dict] = {}
+        self._storage_writer = DebouncedWriter(self._storage_snapshot, self._write_storage)
         self._load_from_storage()
     
     def _load_from_storage(self) -> None:
         """Load blacklist data from persistent storage."""
         if os.path.exists(self.storage_path):
             try:
-                with open(self.storage_path, 'r') as f:
-                    data = json.load(f)
-                    self.single_ips = set(data.get('single_ips', []))
-                    # Convert stored CIDR strings back to IP network objects
-                    self.ip_networks = {ipaddress.ip_network(net) for net in data.get('networks', [])}
-                    self.last_upload_time = data.get('last_upload_time')
+                data = load_path(self.storage_path)
+                entries = data.get('single_ips', []) + data.get('networks', [])
+                self._single_v4, self._single_v6, self._trie_v4, self._trie_v6 = self._build_index(
+                    ipaddress.ip_network(entry) for entry in entries
+                )
+                self.last_upload_time = data.get('last_upload_time')
+                self._details = data.get('details', {})
             except Exception as e:
                 print(f"Error loading from storage: {e}")
+
+    @staticmethod
+    def _build_index(networks) -> Tuple[Set[int], Set[int], pytricia.PyTricia, pytricia.PyTricia]:
+        """Split IP network objects into IPv4/IPv6 single-IP sets and prefix tries."""
+        single_v4, single_v6 = set(), set()
+        trie_v4 = pytricia.PyTricia(32)
+        trie_v6 = pytricia.PyTricia(128)
+        for network in networks:
+            if network.num_addresses == 1:
+                single_ips = single_v4 if network.version == 4 else single_v6
+                single_ips.add(int(network.network_address))
+            else:
+                trie = trie_v4 if network.version == 4 else trie_v6
+                trie.insert(str(network), True)
+        return single_v4, single_v6, trie_v4, trie_v6
+
+    def _split_entries(self) -> Tuple[List[str], List[str]]:
+        """Return stored entries as (single IPs, CIDR networks)."""
+        single_ips = [str(ipaddress.IPv4Address(ip)) for ip in self._single_v4]
+        single_ips.extend(str(ipaddress.IPv6Address(ip)) for ip in self._single_v6)
+        return single_ips, list(self._trie_v4) + list(self._trie_v6)
     
+    def _storage_snapshot(self) -> dict:
+        """Capture the blacklist data to persist."""
+        single_ips, networks = self._split_entries()
+        return {
+            'single_ips': single_ips,
+            'networks': networks,
+            'last_upload_time': self.last_upload_time,
+            'details': dict(self._details)
+        }
+
+    def _write_storage(self, data: dict) -> None:
+        """Atomically write a storage snapshot to disk."""
+        atomic_write_bytes(self.storage_path, encode_for_path(self.storage_path, data))
+
     def _save_to_storage(self) -> None:
-        """Save blacklist data to persistent storage."""
-        try:
-            data = {
-                'single_ips': list(self.single_ips),
-                'networks': [str(net) for net in self.ip_networks],
-                'last_upload_time': self.last_upload_time
-            }
-            with open(self.storage_path, 'w') as f:
-                json.dump(data, f)
-        except Exception as e:
-            print(f"Error saving to storage: {e}")
-    
-    def _is_valid_cidr(self, entry: str) -> bool:
-        """Validate if a string is a valid CIDR notation or IP address."""
-        try:
-            ipaddress.ip_network(entry.strip(), strict=False)
-            return True
-        except ValueError:
-            return False
+        """Save blacklist data to persistent storage, coalescing bursts of updates."""
+        self._storage_writer.mark_dirty()
+
+    async def flush(self) -> None:
+        """Write pending blacklist changes to storage and wait for the write."""
+        await self._storage_writer.flush()
     
+    def reload(self) -> None:
+        """Reload blacklist data from persistent storage."""
+        self._load_from_storage()
+
+    @staticmethod
+    def _entry_key(network: Union[ipaddress.IPv4Network, ipaddress.IPv6Network]) -> str:
+        """Return the stored form of an entry: the bare address for single IPs."""
+        return str(network.network_address) if network.num_addresses == 1 else str(network)
+
+    def add_entry(self, entry: str, details: Optional[dict] = None) -> str:
+        """
+        Add a single IP address or CIDR range, optionally with details about it.
+
+        Returns the entry as stored; raises ValueError if it is invalid.
+        """
+        network = _parse_network(entry.strip())
+        if network is None:
+            raise ValueError(f"Invalid IP address or CIDR range: {entry}")
+
+        if network.num_addresses == 1:
+            single_ips = self._single_v4 if network.version == 4 else self._single_v6
+            single_ips.add(int(network.network_address))
+        else:
+            trie = self._trie_v4 if network.version == 4 else self._trie_v6
+            trie.insert(str(network), True)
+
+        key = self._entry_key(network)
+        if details is not None:
+            self._details[key] = details
+        else:
+            self._details.pop(key, None)
+        self._save_to_storage()
+        return key
+
+    def remove_entry(self, entry: str) -> bool:
+        """
+        Remove a single IP address or CIDR range.
+
+        Returns False if the entry was not in the blacklist; raises ValueError
+        if it is invalid. IPs covered by a remaining range stay blacklisted.
+        """
+        network = _parse_network(entry.strip())
+        if network is None:
+            raise ValueError(f"Invalid IP address or CIDR range: {entry}")
+
+        if network.num_addresses == 1:
+            single_ips = self._single_v4 if network.version == 4 else self._single_v6
+            packed = int(network.network_address)
+            if packed not in single_ips:
+                return False
+            single_ips.remove(packed)
+        else:
+            trie = self._trie_v4 if network.version == 4 else self._trie_v6
+            if not trie.has_key(str(network)):
+                return False
+            trie.delete(str(network))
+
+        self._details.pop(self._entry_key(network), None)
+        self._save_to_storage()
+        return True
+
+    def get_entry_details(self, entry: str) -> Optional[dict]:
+        """Return the details stored with an entry, if it was added with any."""
+        network = _parse_network(entry.strip())
+        if network is None:
+            return None
+        return self._details.get(self._entry_key(network))
+
     def process_entries(self, entries: List[str]) -> UploadResult:
         """Process a list of IP addresses and CIDR ranges."""
         valid_entries = 0
         invalid_entries = 0
-        new_networks = set()
-        new_single_ips = set()
+        new_networks = []
         
         try:
             for entry in entries:
-                entry = entry.strip()
-                if self._is_valid_cidr(entry):
-                    network = ipaddress.ip_network(entry, strict=False)
-                    if network.num_addresses == 1:
-                        new_single_ips.add(str(network.network_address))
-                    else:
-                        new_networks.add(network)
+                network = _parse_network(entry.strip())
+                if network is not None:
+                    new_networks.append(network)
                     valid_entries += 1
                 else:
                     invalid_entries += 1
             
-            # Update the sets
-            self.ip_networks = new_networks
-            self.single_ips = new_single_ips
+            # Replace the lookup structures
+            self._single_v4, self._single_v6, self._trie_v4, self._trie_v6 = self._build_index(new_networks)
+            self._details = {}
             self.last_upload_time = datetime.now().isoformat()
             
             # Save to persistent storage
@@ -102,30 +218,46 @@ class BlacklistService:
     def is_ip_blacklisted(self, ip: str) -> bool:
         """Check if an IP address is blacklisted."""
         try:
-            ip_addr = ipaddress.ip_address(ip)
+            version, packed, address = _parse_address(ip)
             
-            # Check if IP is in single IPs list
-            if ip in self.single_ips:
-                return True
-                
-            # Check if IP is in any of the networks
-            for network in self.ip_networks:
-                if ip_addr in network:
-                    return True
-                    
-            return False
+            if version == 4:
+                return packed in self._single_v4 or address in self._trie_v4
+            # Longest-prefix match covers the CIDR ranges
+            return packed in self._single_v6 or address in self._trie_v6
         except ValueError:
             raise ValueError("Invalid IP address format")
     
+    def are_ips_blacklisted(self, ips: List[str]) -> Dict[str, bool]:
+        """
+        Check many IP addresses at once.
+
+        Returns a mapping of each valid IP to its blacklist status; invalid
+        addresses are left out rather than failing the whole batch.
+        """
+        families = {
+            4: (self._single_v4, self._trie_v4),
+            6: (self._single_v6, self._trie_v6)
+        }
+        results = {}
+        for ip in ips:
+            try:
+                version, packed, address = _parse_address(ip)
+            except ValueError:
+                continue
+            single_ips, trie = families[version]
+            results[ip] = packed in single_ips or address in trie
+        return results
+
     def get_blacklist_status(self) -> dict:
         """Get current status of the blacklist."""
+        single_ips, networks = self._split_entries()
         return {
-            "total_single_ips": len(self.single_ips),
-            "total_networks": len(self.ip_networks),
+            "total_single_ips": len(single_ips),
+            "total_networks": len(networks),
             "last_upload_time": self.last_upload_time,
             "sample_entries": {
-                "single_ips": list(self.single_ips)[:5],
-                "networks": [str(net) for net in list(self.ip_networks)[:5]]
+                "single_ips": single_ips[:5],
+                "networks": networks[:5]
             }
         }
 
@@ -1,11 +1,60 @@
-from typing import Optional, Dict
-import requests
-from requests.exceptions import RequestException
+from typing import Optional, Dict, Tuple
+import asyncio
+import httpx
 import json
+import orjson
+from cachetools import TTLCache
+from dataclasses import asdict
 from datetime import datetime
 from app.models.IpGeoLocationTrackerModel import TimezoneInfo, ConnectionInfo, LocationInfo
 from app.util.ValidateIpAddress import ValidateIpAddress
 
+# Shared across trackers so lookups reuse pooled keep-alive connections;
+# created on first use so a closed client is replaced by the next lookup
+_client: Optional[httpx.AsyncClient] = None
+
+
+def _get_client() -> httpx.AsyncClient:
+    """Return the shared HTTP client, creating it if needed."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=10,
+            limits=httpx.Limits(max_keepalive_connections=100)
+        )
+    return _client
+
+
+# Parsed (location, connection, timezone) records keyed by IP; the dataclasses
+# are frozen so cached instances are shared safely. Per-IP locks coalesce misses;
+# each lock is kept until the last task holding or waiting on it leaves.
+_cache: TTLCache = TTLCache(maxsize=10_000, ttl=3600)
+_locks: Dict[str, asyncio.Lock] = {}
+_lock_users: Dict[str, int] = {}
+_cache_stats = {"hits": 0, "misses": 0}
+
+
+def cache_stats() -> Dict:
+    """Return hit/miss counters and current size of the geolocation cache."""
+    lookups = _cache_stats["hits"] + _cache_stats["misses"]
+    return {
+        "hits": _cache_stats["hits"],
+        "misses": _cache_stats["misses"],
+        "hit_ratio": _cache_stats["hits"] / lookups if lookups else 0.0,
+        "size": len(_cache),
+        "maxsize": _cache.maxsize,
+        "ttl": _cache.ttl
+    }
+
+
+async def close_client() -> None:
+    """Close the shared HTTP client. Call on application shutdown."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
 class IpGeoLocationTracker:
     """
     A class to track IP address information using the IPWHOIS API.
@@ -13,7 +62,6 @@ class IpGeoLocationTracker:
     """
     
     API_URL = "http://ipwho.is/{}"
-    TIMEOUT = 10  # seconds
     
     def __init__(self, ip: str = "136.233.9.98"):
         """
@@ -34,38 +82,66 @@ class IpGeoLocationTracker:
         self.timezone: Optional[TimezoneInfo] = None
         
 
-    def track_ip(self) -> bool:
+    async def track_ip(self) -> bool:
         """
         Fetch and process IP information.
         
+        Results are served from a shared TTL cache when available; concurrent
+        lookups for the same IP share a single API request.
+        
         Returns:
             bool: True if successful, False otherwise
             
         Raises:
-            RequestException: If the API request fails
+            httpx.HTTPError: If the API request fails
         """
+        records = _cache.get(self.ip)
+        if records is None:
+            lock = _locks.setdefault(self.ip, asyncio.Lock())
+            _lock_users[self.ip] = _lock_users.get(self.ip, 0) + 1
+            try:
+                async with lock:
+                    records = _cache.get(self.ip)
+                    if records is None:
+                        _cache_stats["misses"] += 1
+                        records = self._parse_ip_data(await self._fetch_ip_data())
+                        _cache[self.ip] = records
+                    else:
+                        _cache_stats["hits"] += 1
+            finally:
+                users = _lock_users[self.ip] - 1
+                if users:
+                    _lock_users[self.ip] = users
+                else:
+                    del _lock_users[self.ip]
+                    del _locks[self.ip]
+        else:
+            _cache_stats["hits"] += 1
+
+        self.location, self.connection, self.timezone = records
+        return True
+
+    async def _fetch_ip_data(self) -> Dict:
+        """Request IP information from the API and return the validated payload."""
         try:
-            response = requests.get(
-                self.API_URL.format(self.ip),
-                timeout=self.TIMEOUT
-            )
+            response = await _get_client().get(self.API_URL.format(self.ip))
             response.raise_for_status()
-            data = response.json()
+            data = orjson.loads(response.content)
             
             if not data.get("success", True):  
                 raise ValueError(f"API Error: {data.get('message', 'Unknown error')}")
                 
-            self._process_ip_data(data)
-            return True
+            return data
             
-        except RequestException as e:
-            raise RequestException(f"Failed to fetch IP data: {str(e)}")
-        except json.JSONDecodeError as e:
+        except httpx.HTTPError as e:
+            raise httpx.HTTPError(f"Failed to fetch IP data: {str(e)}")
+        except orjson.JSONDecodeError as e:
             raise ValueError(f"Failed to parse API response: {str(e)}")
             
-    def _process_ip_data(self, data: Dict) -> None:
-        """Process the API response and populate class attributes."""
-        self.location = LocationInfo(
+    @staticmethod
+    def _parse_ip_data(data: Dict) -> Tuple[LocationInfo, ConnectionInfo, TimezoneInfo]:
+        """Process the API response into location, connection and timezone records."""
+        location = LocationInfo(
             type=data.get("type", ""),
             continent=data.get("continent", ""),
             continent_code=data.get("continent_code", ""),
@@ -84,7 +160,7 @@ class IpGeoLocationTracker:
             country_flag=data.get("flag", {}).get("emoji", "")
         )
         
-        self.connection = ConnectionInfo(
+        connection = ConnectionInfo(
             asn=int(data.get("connection", {}).get("asn", 0)),
             org=data.get("connection", {}).get("org", ""),
             isp=data.get("connection", {}).get("isp", ""),
@@ -92,7 +168,7 @@ class IpGeoLocationTracker:
         )
         
         timezone_data = data.get("timezone", {})
-        self.timezone = TimezoneInfo(
+        timezone = TimezoneInfo(
             id=timezone_data.get("id", ""),
             abbr=timezone_data.get("abbr", ""),
             is_dst=bool(timezone_data.get("is_dst", False)),
@@ -100,21 +176,23 @@ class IpGeoLocationTracker:
             utc=timezone_data.get("utc", ""),
             current_time=datetime.fromisoformat(timezone_data.get("current_time", "").replace("Z", "+00:00"))
         )
+        
+        return location, connection, timezone
 
     def to_dict(self) -> Dict:
         """Convert the tracker data to a dictionary format."""
         return {
             "ip": self.ip,
-            "location": self.location.__dict__ if self.location else None,
-            "connection": self.connection.__dict__ if self.connection else None,
-            "timezone": self.timezone.__dict__ if self.timezone else None
+            "location": asdict(self.location) if self.location else None,
+            "connection": asdict(self.connection) if self.connection else None,
+            "timezone": asdict(self.timezone) if self.timezone else None
         }
 
 if __name__ == "__main__":
     try:
         # Example usage
         tracker = IpGeoLocationTracker("8.8.8.8")
-        tracker.track_ip()
+        asyncio.run(tracker.track_ip())
         
         # Access data through structured objects
         if tracker.location:
@@ -130,5 +208,5 @@ if __name__ == "__main__":
         all_data = tracker.to_dict()
         print(json.dumps(all_data, default=str, indent=2))
         
-    except (ValueError, RequestException) as e:
+    except (ValueError, httpx.HTTPError) as e:
         print(f"Error: {e}")
\ No newline at end of file
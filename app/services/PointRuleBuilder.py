@@ -1,8 +1,19 @@
-from typing import Dict, List, Optional, Union
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple, Union
 from pathlib import Path
-from pydantic import BaseModel, Field, field_validator
-import json
+import hashlib
+import pickle
+import zlib
+from pydantic import BaseModel, Field, PrivateAttr, field_validator
 from app.models.PointRuleBuilderModel import GeoAttribute 
+from app.util.SerializedFile import atomic_write_bytes, decode_for_path, encode_for_path, load_path
+
+# Compiled rules cache stored next to the rules file as <name>.cache:
+# magic + format version + SHA-256 of the source file + zlib-compressed pickle
+# of the system. Bump the version whenever PointRuleSystem's layout changes.
+RULES_CACHE_SUFFIX = ".cache"
+_RULES_CACHE_MAGIC = b"REP"
+_RULES_CACHE_VERSION = 3
 
 
 class PointRule(BaseModel):
@@ -58,9 +69,70 @@ class PointRuleSystem(BaseModel):
     rules: List[PointRule] = Field(default_factory=list)
     groups: Dict[str, RuleGroup] = Field(default_factory=dict)
 
+    # Dispatch index over rules and group rules, keyed by attribute name:
+    # summed points of match-any rules, summed points per exact value, and
+    # (value, points) pairs for unhashable values that need a linear compare
+    _wildcard: Dict[str, int] = PrivateAttr(default_factory=lambda: defaultdict(int))
+    _exact: Dict[str, Dict[Any, int]] = PrivateAttr(default_factory=lambda: defaultdict(dict))
+    _fallback: Dict[str, List[Tuple[Any, int]]] = PrivateAttr(default_factory=lambda: defaultdict(list))
+    # Snapshot of the containers the index was built from; see _index_state
+    _index_key: Optional[tuple] = PrivateAttr(default=None)
+
+    def model_post_init(self, __context: Any) -> None:
+        self._rebuild_index()
+
+    def _index_state(self) -> tuple:
+        """
+        Identify the rule containers and their sizes.
+
+        The rules and groups are public, so rules can be appended or removed
+        without going through add_rule/add_to_group, and model_copy shares the
+        index dicts with the original. Either shows up as a changed state, and
+        the index is rebuilt before it is next used.
+        """
+        return (
+            id(self),
+            id(self.rules),
+            len(self.rules),
+            tuple((id(group.rules), len(group.rules)) for group in self.groups.values())
+        )
+
+    def _ensure_index(self) -> None:
+        """Rebuild the index if rules or groups changed behind its back."""
+        if self._index_key != self._index_state():
+            self._rebuild_index()
+
+    def _index_rule(self, rule: PointRule) -> None:
+        """Register a rule in the attribute dispatch index."""
+        # Resolved to the plain string once here, so evaluation never touches the enum
+        attribute = rule.attribute.value
+        if rule.value is None:
+            self._wildcard[attribute] += rule.points
+            return
+        try:
+            values = self._exact[attribute]
+            values[rule.value] = values.get(rule.value, 0) + rule.points
+        except TypeError:
+            self._fallback[attribute].append((rule.value, rule.points))
+
+    def _rebuild_index(self) -> None:
+        """Rebuild the attribute dispatch index from all rules and groups."""
+        self._wildcard = defaultdict(int)
+        self._exact = defaultdict(dict)
+        self._fallback = defaultdict(list)
+        for rule in self.rules:
+            self._index_rule(rule)
+        for group in self.groups.values():
+            for rule in group.rules:
+                self._index_rule(rule)
+        self._index_key = self._index_state()
+
     def add_rule(self, rule: PointRule) -> None:
         """Add a single rule to the system."""
+        self._ensure_index()
         self.rules.append(rule)
+        self._index_rule(rule)
+        self._index_key = self._index_state()
 
     def create_group(self, name: str, description: Optional[str] = None) -> RuleGroup:
         """Create a new rule group."""
@@ -74,29 +146,34 @@ class PointRuleSystem(BaseModel):
         """Add a rule to a specific group."""
         if group_name not in self.groups:
             raise ValueError(f"Group '{group_name}' does not exist")
+        self._ensure_index()
         self.groups[group_name].rules.append(rule)
+        self._index_rule(rule)
+        self._index_key = self._index_state()
 
     def evaluate_rules(self, data: Dict) -> int:
         """Evaluate all rules against provided data and return total points."""
+        self._ensure_index()
         total_points = 0
+        wildcard, exact, fallback = self._wildcard, self._exact, self._fallback
         
-        # Evaluate individual rules
-        for rule in self.rules:
-            if rule.attribute.value in data:
-                if rule.value is None or data[rule.attribute.value] == rule.value:
-                    total_points += rule.points
-        
-        # Evaluate group rules
-        for group in self.groups.values():
-            for rule in group.rules:
-                if rule.attribute.value in data:
-                    if rule.value is None or data[rule.attribute.value] == rule.value:
-                        total_points += rule.points
+        # One hash lookup per attribute present in data, independent of rule count
+        for attribute, value in data.items():
+            total_points += wildcard.get(attribute, 0)
+            values = exact.get(attribute)
+            if values:
+                try:
+                    total_points += values.get(value, 0)
+                except TypeError:
+                    pass  # unhashable input never equals a hashable rule value
+            for rule_value, points in fallback.get(attribute, ()):
+                if rule_value == value:
+                    total_points += points
         
         return total_points
 
     def save_rules(self, filepath: Union[str, Path]) -> None:
-        """Save rules and groups to JSON."""
+        """Save rules and groups to JSON, or MessagePack for a .msgpack path."""
         data = {
             "rules": [rule.dict() for rule in self.rules],
             "groups": {name: group.dict() for name, group in self.groups.items()}
@@ -105,42 +182,104 @@ class PointRuleSystem(BaseModel):
         filepath = Path(filepath)
         try:
             filepath.parent.mkdir(parents=True, exist_ok=True)
-            with filepath.open('w') as f:
-                json.dump(data, f, indent=4)
+            atomic_write_bytes(filepath, encode_for_path(filepath, data, indent=True))
         except Exception as e:
             raise IOError(f"Failed to save rules: {e}")
 
     @classmethod
-    def load_rules(cls, filepath: Union[str, Path]) -> 'PointRuleSystem':
-        """Load rules and groups from JSON."""
+    def load_rules(cls, filepath: Union[str, Path], validate: bool = False) -> 'PointRuleSystem':
+        """
+        Load rules and groups from JSON, or MessagePack for a .msgpack path.
+
+        Files written by save_rules are trusted, so models are built with
+        model_construct and validators are skipped, and the built system is
+        cached in a binary file next to the source that is reused while the
+        source is unchanged. Pass validate=True for files that did not come
+        from this system; that path neither reads nor writes the cache.
+        """
         filepath = Path(filepath)
         try:
-            with filepath.open('r') as f:
-                data = json.load(f)
-                
+            if validate:
+                data = load_path(filepath)
+            else:
+                # Hash and decode the same bytes, so the cache always matches
+                # the content it was built from
+                raw = filepath.read_bytes()
+                digest = hashlib.sha256(raw).digest()
+                cache_path = filepath.with_name(filepath.name + RULES_CACHE_SUFFIX)
+                cached = _read_rules_cache(cache_path, digest)
+                if cached is not None:
+                    return cached
+                data = decode_for_path(filepath, raw)
+            
             system = cls()
+            build_rule = PointRule if validate else PointRule.model_construct
             
             # Load individual rules
             for rule_data in data.get("rules", []):
+                # Coerce explicitly, model_construct does not run validation
                 rule_data["attribute"] = GeoAttribute(rule_data["attribute"])
-                system.add_rule(PointRule(**rule_data))
+                system.add_rule(build_rule(**rule_data))
             
             # Load groups
             for group_name, group_data in data.get("groups", {}).items():
-                group = system.create_group(
-                    name=group_name,
-                    description=group_data.get("description")
-                )
+                rules = []
                 for rule_data in group_data.get("rules", []):
                     rule_data["attribute"] = GeoAttribute(rule_data["attribute"])
-                    group.rules.append(PointRule(**rule_data))
-                    
+                    rules.append(build_rule(**rule_data))
+
+                if validate:
+                    group = system.create_group(
+                        name=group_name,
+                        description=group_data.get("description")
+                    )
+                    group.rules.extend(rules)
+                else:
+                    system.groups[group_name] = RuleGroup.model_construct(
+                        name=group_name,
+                        description=group_data.get("description"),
+                        rules=rules
+                    )
+
+            system._rebuild_index()
+            if not validate:
+                _write_rules_cache(cache_path, digest, system)
             return system
             
         except Exception as e:
             raise IOError(f"Failed to load rules: {e}")
 
 
+def _rules_cache_header(digest: bytes) -> bytes:
+    """Return the cache header for a source file with this digest."""
+    return _RULES_CACHE_MAGIC + _RULES_CACHE_VERSION.to_bytes(2, "big") + digest
+
+
+def _read_rules_cache(cache_path: Path, digest: bytes) -> Optional[PointRuleSystem]:
+    """Return the cached system if it has this format version and source digest."""
+    header = _rules_cache_header(digest)
+    try:
+        raw = cache_path.read_bytes()
+        if not raw.startswith(header):
+            return None
+        system = pickle.loads(zlib.decompress(memoryview(raw)[len(header):]))
+        # The pickled index matches the pickled rules; only the object is new
+        system._index_key = system._index_state()
+        return system
+    except Exception:
+        # A missing, stale or unreadable cache just means a full load
+        return None
+
+
+def _write_rules_cache(cache_path: Path, digest: bytes, system: PointRuleSystem) -> None:
+    """Write the compiled rules cache; failures only cost the next load its shortcut."""
+    try:
+        payload = zlib.compress(pickle.dumps(system, protocol=pickle.HIGHEST_PROTOCOL))
+        atomic_write_bytes(cache_path, _rules_cache_header(digest) + payload)
+    except Exception as e:
+        print(f"Error writing rules cache: {e}")
+
+
 
 
 
@@ -1,13 +1,20 @@
-from typing import Dict, Optional, List, Union
-from dataclasses import dataclass
+from typing import Dict, Optional, List, Set, Tuple, Union
+from dataclasses import asdict, dataclass
+import asyncio
 from datetime import datetime
-import json
 import ipaddress
+import sqlite3
 from pathlib import Path
 
+import orjson
+from sortedcontainers import SortedList
+
+from app.models.ReputationManagerModel import BlacklistEntry, BlacklistReason
 from app.services.IpGeoLocationTracker import IpGeoLocationTracker
+from app.services.PointRuleBuilder import PointRule, PointRuleSystem
+from app.util.DebouncedWriter import DebouncedWriter
 
-@dataclass
+@dataclass(slots=True)
 class ReputationScore:
     ip: str
     score: int
@@ -21,7 +28,7 @@ class ReputationManager:
         self,
         blacklist_service,
         point_system,
-        storage_path: str = "reputation_data.json"
+        storage_path: str = "reputation_data.db"
     ):
         """
         Initialize the Reputation Manager.
@@ -29,46 +36,117 @@ class ReputationManager:
         Args:
             blacklist_service: BlacklistService instance
             point_system: PointRuleSystem instance
-            storage_path: Path to store reputation data
+            storage_path: Path of the SQLite database storing reputation data
         """
         self.blacklist_service = blacklist_service
         self.point_system = point_system
         self.storage_path = Path(storage_path)
         self.reputation_data: Dict[str, ReputationScore] = {}
+
+        # Aggregates kept in step with reputation_data for the risk/stats queries
+        self._score_index = SortedList()  # (score, ip)
+        self._score_sum = 0
+        self._blacklisted_ips: Set[str] = set()
+
+        # One row per IP so an update rewrites only that IP, not the whole store.
+        # Changed IPs are batched by a debounced writer, which runs one write at
+        # a time on a worker thread, so the connection may be shared across threads.
+        self.storage_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.storage_path, isolation_level=None, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS reputation ("
+            "ip TEXT PRIMARY KEY, score INTEGER, blacklisted INTEGER, json BLOB)"
+        )
+        self._dirty_ips: Set[str] = set()
+        self._storage_writer = DebouncedWriter(self._storage_snapshot, self._write_storage)
+        self._import_legacy_json()
         self._load_reputation_data()
 
+    def _import_legacy_json(self) -> None:
+        """
+        Import reputation data from the JSON file earlier versions stored.
+
+        Runs only while the database is empty, so the import happens once; the
+        JSON file is left in place.
+        """
+        legacy_path = self.storage_path.with_suffix(".json")
+        if not legacy_path.exists():
+            return
+        if self._conn.execute("SELECT 1 FROM reputation LIMIT 1").fetchone() is not None:
+            return
+
+        try:
+            data = orjson.loads(legacy_path.read_bytes())
+            rows = []
+            for score_data in data.values():
+                score = ReputationScore(**score_data)
+                rows.append((score.ip, score.score, int(score.blacklisted), orjson.dumps(asdict(score))))
+            self._write_storage(rows)
+            print(f"Imported {len(rows)} reputation records from {legacy_path}")
+        except Exception as e:
+            print(f"Error importing reputation data from {legacy_path}: {e}")
+
     def _load_reputation_data(self) -> None:
         """Load existing reputation data from storage."""
-        if self.storage_path.exists():
-            try:
-                with open(self.storage_path, 'r') as f:
-                    data = json.load(f)
-                    for ip, score_data in data.items():
-                        self.reputation_data[ip] = ReputationScore(**score_data)
-            except Exception as e:
-                print(f"Error loading reputation data: {e}")
-
-    def _save_reputation_data(self) -> None:
-        """Save reputation data to storage."""
         try:
-            data = {
-                ip: {
-                    'ip': score.ip,
-                    'score': score.score,
-                    'last_updated': score.last_updated,
-                    'location_info': score.location_info,
-                    'blacklisted': score.blacklisted,
-                    'points_breakdown': score.points_breakdown
-                }
-                for ip, score in self.reputation_data.items()
-            }
-            self.storage_path.parent.mkdir(parents=True, exist_ok=True)
-            with open(self.storage_path, 'w') as f:
-                json.dump(data, f, indent=4)
+            for ip, score_json in self._conn.execute("SELECT ip, json FROM reputation"):
+                self._store_score(ReputationScore(**orjson.loads(score_json)))
         except Exception as e:
-            print(f"Error saving reputation data: {e}")
+            print(f"Error loading reputation data: {e}")
+
+    def _storage_snapshot(self) -> List[Tuple]:
+        """Take the rows for IPs changed since the last write."""
+        dirty_ips, self._dirty_ips = self._dirty_ips, set()
+        rows = []
+        for ip in dirty_ips:
+            score = self.reputation_data[ip]
+            rows.append((score.ip, score.score, int(score.blacklisted), orjson.dumps(asdict(score))))
+        return rows
+
+    def _write_storage(self, rows: List[Tuple]) -> None:
+        """Write a batch of rows to storage in a single transaction."""
+        if not rows:
+            return
+        try:
+            self._conn.execute("BEGIN")
+            self._conn.executemany("INSERT OR REPLACE INTO reputation VALUES (?, ?, ?, ?)", rows)
+            self._conn.execute("COMMIT")
+        except Exception:
+            if self._conn.in_transaction:
+                self._conn.execute("ROLLBACK")
+            # Keep the IPs queued so the next write retries them
+            self._dirty_ips.update(row[0] for row in rows)
+            raise
 
-    def calculate_reputation(self, ip: str) -> ReputationScore:
+    def _save_reputation_data(self, score: ReputationScore) -> None:
+        """Queue a single IP's reputation data to be saved to storage."""
+        self._dirty_ips.add(score.ip)
+        self._storage_writer.mark_dirty()
+
+    def _store_score(self, score: ReputationScore) -> None:
+        """Put a score in reputation_data and update the aggregates."""
+        previous = self.reputation_data.get(score.ip)
+        if previous is not None:
+            self._score_index.remove((previous.score, previous.ip))
+            self._score_sum -= previous.score
+            self._blacklisted_ips.discard(previous.ip)
+
+        self.reputation_data[score.ip] = score
+        self._score_index.add((score.score, score.ip))
+        self._score_sum += score.score
+        if score.blacklisted:
+            self._blacklisted_ips.add(score.ip)
+
+    async def flush(self) -> None:
+        """Write pending reputation changes to storage and wait for the write."""
+        await self._storage_writer.flush()
+
+    def close(self) -> None:
+        """Write any pending changes and close the reputation database."""
+        self._storage_writer.write_now()
+        self._conn.close()
+
+    async def calculate_reputation(self, ip: str) -> ReputationScore:
         """
         Calculate reputation score for an IP address.
         
@@ -84,27 +162,46 @@ class ReputationManager:
             
             # Check blacklist status
             is_blacklisted = self.blacklist_service.is_ip_blacklisted(ip)
-            print('is_blacklisted', is_blacklisted)
+        except Exception as e:
+            raise ValueError(f"Error calculating reputation for IP {ip}: {str(e)}")
+
+        return await self._calculate_reputation_core(ip, is_blacklisted)
+
+    async def _calculate_reputation_core(self, ip: str, is_blacklisted: bool) -> ReputationScore:
+        """Score an already validated IP whose blacklist status is known."""
+        # Blacklisted IPs get the penalty outright, without a geolocation lookup
+        if is_blacklisted:
+            reputation_score = ReputationScore(
+                ip=ip,
+                score=-100,
+                last_updated=datetime.now().isoformat(),
+                blacklisted=True,
+                points_breakdown={"blacklist_penalty": -100}
+            )
+            self._store_score(reputation_score)
+            self._save_reputation_data(reputation_score)
+            return reputation_score
+
+        try:
             # Get geolocation data
             geo_tracker = IpGeoLocationTracker(ip)
-            success = geo_tracker.track_ip()
+            success = await geo_tracker.track_ip()
             
             if not success:
                 raise ValueError(f"Failed to get geolocation data for IP {ip}")
                 
-            geo_data = geo_tracker.to_dict()
-            
-            # Prepare data for point system evaluation
+            # Prepare data for point system evaluation straight from the records
+            location, connection = geo_tracker.location, geo_tracker.connection
             evaluation_data = {
-                "is_eu": geo_data["location"]["is_eu"],
-                "country": geo_data["location"]["country"],
-                "continent": geo_data["location"]["continent"],
-                "latitude": geo_data["location"]["latitude"],
-                "longitude": geo_data["location"]["longitude"],
-                "connection_type": geo_data["location"]["type"],
-                "isp": geo_data["connection"]["isp"],
-                "org": geo_data["connection"]["org"],
-                "asn": geo_data["connection"]["asn"]
+                "is_eu": location.is_eu,
+                "country": location.country,
+                "continent": location.continent,
+                "latitude": location.latitude,
+                "longitude": location.longitude,
+                "connection_type": location.type,
+                "isp": connection.isp,
+                "org": connection.org,
+                "asn": connection.asn
             }
             
             # Calculate points based on rules
@@ -113,7 +210,7 @@ class ReputationManager:
             # Create points breakdown
             points_breakdown = {
                 "base_points": points,
-                "blacklist_penalty": -100 if is_blacklisted else 0,
+                "blacklist_penalty": 0,
                 "connection_score": 10 if evaluation_data["connection_type"] == "IPv4" else 5,
                 "geo_score": 20 if not evaluation_data["is_eu"] else 10  # Example scoring logic
             }
@@ -126,14 +223,14 @@ class ReputationManager:
                 ip=ip,
                 score=total_score,
                 last_updated=datetime.now().isoformat(),
-                location_info=geo_data,
-                blacklisted=is_blacklisted,
+                location_info=geo_tracker.to_dict(),
+                blacklisted=False,
                 points_breakdown=points_breakdown
             )
             
             # Update stored data
-            self.reputation_data[ip] = reputation_score
-            self._save_reputation_data()
+            self._store_score(reputation_score)
+            self._save_reputation_data(reputation_score)
             
             return reputation_score
             
@@ -144,37 +241,135 @@ class ReputationManager:
         """Get stored reputation data for an IP address."""
         return self.reputation_data.get(ip)
 
-    def bulk_update_reputation(self, ips: List[str]) -> Dict[str, ReputationScore]:
-        """Update reputation scores for multiple IPs."""
+    async def bulk_update_reputation(
+        self,
+        ips: List[str],
+        max_concurrency: int = 64
+    ) -> Dict[str, ReputationScore]:
+        """
+        Update reputation scores for multiple IPs.
+
+        Lookups run concurrently, at most max_concurrency at a time. State and
+        storage updates stay on the event loop, so they need no locking.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def update(ip: str) -> ReputationScore:
+            async with semaphore:
+                return await self._calculate_reputation_core(ip, blacklisted[ip])
+
+        # Repeated IPs would only redo the same lookup and overwrite the same result
+        unique_ips = list(dict.fromkeys(ips))
+
+        # Validate and check the blacklist for the whole batch in one call;
+        # IPs left out of the result are invalid
+        blacklisted = self.blacklist_service.are_ips_blacklisted(unique_ips)
+        valid_ips = []
+        for ip in unique_ips:
+            if ip in blacklisted:
+                valid_ips.append(ip)
+            else:
+                print(f"Error updating reputation for IP {ip}: Invalid IP address format")
+
+        scores = await asyncio.gather(*(update(ip) for ip in valid_ips), return_exceptions=True)
+
         results = {}
-        for ip in ips:
-            try:
-                score = self.calculate_reputation(ip)
-                results[ip] = score                
-            except Exception as e:
-                print(f"Error updating reputation for IP {ip}: {e}")
+        for ip, score in zip(valid_ips, scores):
+            if isinstance(score, BaseException):
+                print(f"Error updating reputation for IP {ip}: {score}")
+            else:
+                results[ip] = score
         return results
 
     def get_high_risk_ips(self, threshold: int = 0) -> List[str]:
-        """Get list of IPs with scores below threshold."""
-        return [
-            ip for ip, score in self.reputation_data.items()
-            if score.score < threshold or score.blacklisted
-        ]
+        """Get list of IPs with scores below threshold, plus any blacklisted IPs."""
+        # (threshold,) sorts before every (threshold, ip) entry
+        cutoff = self._score_index.bisect_left((threshold,))
+        high_risk = [ip for _, ip in self._score_index.islice(stop=cutoff)]
+        high_risk.extend(
+            ip for ip in self._blacklisted_ips
+            if self.reputation_data[ip].score >= threshold
+        )
+        return high_risk
 
     def get_reputation_stats(self) -> Dict:
         """Get statistical summary of reputation data."""
         if not self.reputation_data:
             return {"total_ips": 0}
             
-        scores = [score.score for score in self.reputation_data.values()]
+        total_ips = len(self._score_index)
         return {
-            "total_ips": len(scores),
-            "average_score": sum(scores) / len(scores),
-            "blacklisted_count": sum(
-                1 for score in self.reputation_data.values() 
-                if score.blacklisted
-            ),
-            "min_score": min(scores),
-            "max_score": max(scores)
+            "total_ips": total_ips,
+            "average_score": self._score_sum / total_ips,
+            "blacklisted_count": len(self._blacklisted_ips),
+            "min_score": self._score_index[0][0],
+            "max_score": self._score_index[-1][0]
         }
+
+    async def analyze_ip(self, ip: str) -> Dict:
+        """Score an IP and return it with its location and blacklist details."""
+        try:
+            score = await self.calculate_reputation(ip)
+        except ValueError as e:
+            return {"status": "error", "error": str(e)}
+
+        location_info = score.location_info or {}
+        return {
+            "status": "success",
+            "location": location_info.get("location"),
+            "connection": location_info.get("connection"),
+            "timezone": location_info.get("timezone"),
+            "reputation_score": {
+                "score": score.score,
+                "last_updated": score.last_updated,
+                "blacklisted": score.blacklisted,
+                "points_breakdown": score.points_breakdown
+            },
+            "blacklist_entry": self.blacklist_service.get_entry_details(ip) if score.blacklisted else None
+        }
+
+    def add_to_blacklist(
+        self,
+        ip_address: str,
+        reason: BlacklistReason,
+        expires_at: Optional[datetime] = None,
+        notes: Optional[str] = None
+    ) -> BlacklistEntry:
+        """Blacklist an IP address or CIDR range, recording why."""
+        entry = BlacklistEntry(ip_address=ip_address, reason=reason, expires_at=expires_at, notes=notes)
+        self.blacklist_service.add_entry(ip_address, entry.model_dump(mode="json"))
+        return entry
+
+    def remove_from_blacklist(self, ip_address: str) -> bool:
+        """Remove an IP address or CIDR range from the blacklist."""
+        return self.blacklist_service.remove_entry(ip_address)
+
+    def is_blacklisted(self, ip_address: str) -> bool:
+        """Check whether an IP address is blacklisted."""
+        return self.blacklist_service.is_ip_blacklisted(ip_address)
+
+    def get_blacklist_entry(self, ip_address: str) -> Optional[Dict]:
+        """Get the details recorded when an entry was blacklisted, if any."""
+        return self.blacklist_service.get_entry_details(ip_address)
+
+    async def save_blacklist(self) -> None:
+        """Write the blacklist to its storage file."""
+        self.blacklist_service._save_to_storage()
+        await self.blacklist_service.flush()
+
+    def load_blacklist(self) -> None:
+        """Reload the blacklist from its storage file."""
+        self.blacklist_service.reload()
+
+    @property
+    def rules(self) -> List[PointRule]:
+        """Top-level rules of the point system."""
+        return self.point_system.rules
+
+    def save_rules(self, filepath: Union[str, Path]) -> None:
+        """Save the point rules to a file."""
+        self.point_system.save_rules(filepath)
+
+    def load_rules(self, filepath: Union[str, Path]) -> None:
+        """Replace the point rules with those in a file written by save_rules."""
+        self.point_system = PointRuleSystem.load_rules(filepath)
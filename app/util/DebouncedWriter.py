@@ -0,0 +1,65 @@
+import asyncio
+from typing import Any, Callable, Optional
+
+
+class DebouncedWriter:
+    """
+    Coalesce bursts of state changes into a single background write.
+
+    mark_dirty() schedules a write `delay` seconds later on the running event
+    loop; further calls inside that window are absorbed into the same write.
+    `snapshot` runs on the event loop so it sees consistent state, and `write`
+    receives its result on a worker thread. Without a running loop the write
+    happens immediately. A failed write leaves the writer dirty, so the next
+    change or flush() retries it.
+    """
+
+    def __init__(self, snapshot: Callable[[], Any], write: Callable[[Any], None], delay: float = 0.2):
+        self.snapshot = snapshot
+        self.write = write
+        self.delay = delay
+        self._dirty = False
+        self._task: Optional[asyncio.Task] = None
+
+    def mark_dirty(self) -> None:
+        """Record a change and schedule a write."""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.write_now()
+            return
+
+        self._dirty = True
+        if self._task is None or self._task.done():
+            self._task = loop.create_task(self._run())
+
+    def _write(self, data: Any) -> bool:
+        """Write a snapshot, marking the writer dirty again if it fails."""
+        try:
+            self.write(data)
+            return True
+        except Exception as e:
+            self._dirty = True
+            print(f"Error writing debounced state: {e}")
+            return False
+
+    async def _run(self) -> None:
+        while self._dirty:
+            await asyncio.sleep(self.delay)
+            self._dirty = False
+            if not await asyncio.to_thread(self._write, self.snapshot()):
+                # Retry on the next change or flush rather than in a tight loop
+                return
+
+    def write_now(self) -> None:
+        """Write the current state synchronously."""
+        self._dirty = False
+        self._write(self.snapshot())
+
+    async def flush(self) -> None:
+        """Wait for any scheduled write, then write whatever is still pending."""
+        if self._task is not None:
+            await self._task
+        if self._dirty:
+            self._dirty = False
+            await asyncio.to_thread(self._write, self.snapshot())
@@ -0,0 +1,44 @@
+from typing import Any
+
+import ormsgpack
+from fastapi import Request
+from fastapi.responses import Response
+
+
+class MsgPackResponse(Response):
+    """Response encoded as MessagePack, for service-to-service callers."""
+    media_type = "application/x-msgpack"
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return ormsgpack.packb(content)
+
+
+def _accept_quality(accept: str, media_type: str) -> float:
+    """Return the q value an Accept header gives a media type, 0 if not listed."""
+    for media_range in accept.split(","):
+        name, *params = (field.strip() for field in media_range.split(";"))
+        if name.lower() != media_type:
+            continue
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    return float(value)
+                except ValueError:
+                    return 0.0
+        return 1.0
+    return 0.0
+
+
+def wants_msgpack(request: Request) -> bool:
+    """
+    Return True if the client prefers MessagePack over JSON.
+
+    MessagePack must be listed explicitly with a non-zero q value, at least as
+    high as any explicit JSON preference; wildcards keep the JSON default.
+    """
+    accept = request.headers.get("accept", "")
+    msgpack_quality = _accept_quality(accept, MsgPackResponse.media_type)
+    return msgpack_quality > 0 and msgpack_quality >= _accept_quality(accept, "application/json")
@@ -0,0 +1,66 @@
+import mmap
+import os
+import tempfile
+from pathlib import Path
+from typing import Any, Union
+
+import orjson
+import ormsgpack
+
+# Files with this suffix hold MessagePack; anything else is JSON
+MSGPACK_SUFFIX = ".msgpack"
+
+
+def atomic_write_bytes(path: Union[str, Path], data: bytes) -> None:
+    """
+    Write bytes to a file atomically.
+
+    The data is written to a uniquely named temporary file next to the target
+    and swapped in with os.replace, so readers never observe a partially
+    written file and concurrent writers to the same path never share one.
+    """
+    path = Path(path)
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_name, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_name)
+        except OSError:
+            pass
+        raise
+
+
+def encode_for_path(path: Union[str, Path], data: Any, indent: bool = False) -> bytes:
+    """Encode data in the format implied by the file suffix."""
+    if Path(path).suffix == MSGPACK_SUFFIX:
+        return ormsgpack.packb(data)
+    return orjson.dumps(data, option=orjson.OPT_INDENT_2 if indent else None)
+
+
+def decode_for_path(path: Union[str, Path], data: bytes) -> Any:
+    """Decode bytes in the format implied by the file suffix."""
+    if Path(path).suffix == MSGPACK_SUFFIX:
+        return ormsgpack.unpackb(data)
+    return orjson.loads(data)
+
+
+def load_path(path: Union[str, Path]) -> Any:
+    """
+    Decode a JSON or MessagePack file.
+
+    MessagePack files are memory-mapped and decoded straight from the mapping,
+    so uvicorn workers loading the same file share its page cache instead of
+    each holding a private read buffer.
+    """
+    path = Path(path)
+    with path.open('rb') as f:
+        if path.suffix != MSGPACK_SUFFIX:
+            return orjson.loads(f.read())
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            with memoryview(buf) as view:
+                return ormsgpack.unpackb(view)
@@ -1,5 +1,16 @@
+import socket
+from typing import Iterable, List
+
+
 def ValidateIpAddress(ip_address: str) -> bool:
-        parts = ip_address.split('.')
-        if len(parts) != 4:
-            return False
-        return all(part.isdigit() and 0 <= int(part) <= 255 for part in parts)
+    # inet_pton parses strict dotted-quad IPv4 in C, rejecting leading zeros
+    try:
+        socket.inet_pton(socket.AF_INET, ip_address)
+        return True
+    except (OSError, ValueError):
+        return False
+
+
+def validate_ip_batch(ip_addresses: Iterable[str]) -> List[bool]:
+    """Validate many IPv4 addresses, returning one flag per input."""
+    return [ValidateIpAddress(ip_address) for ip_address in ip_addresses]